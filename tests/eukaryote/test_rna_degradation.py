@@ -20,25 +20,57 @@ import wc_kb
 import wc_kb_gen
 
 
+def setUpModule():
+    global tmp_dirname, sequence_path
+    tmp_dirname = tempfile.mkdtemp()
+    sequence_path = os.path.join(tmp_dirname, 'test_seq.fasta')
+    with open(sequence_path, 'w') as f:
+        f.write('>chr1\nTTTATGACTCTAGTTTAT\n'
+                '>chrM\nTTTatgaCTCTAGTTTAT\n')
+
+
+def tearDownModule():
+    shutil.rmtree(tmp_dirname)
+
+
 class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
 
-        # Create KB content
-        self.tmp_dirname = tempfile.mkdtemp()
-        self.sequence_path = os.path.join(self.tmp_dirname, 'test_seq.fasta')
-        with open(self.sequence_path, 'w') as f:
-            f.write('>chr1\nTTTATGACTCTAGTTTAT\n'
-                    '>chrM\nTTTatgaCTCTAGTTTAT\n')
+        # Create KB and initial model content
+        cls._kb = wc_kb.KnowledgeBase()
+        cell = cls._kb.cell = wc_kb.Cell()
 
-        self.kb = wc_kb.KnowledgeBase()
-        cell = self.kb.cell = wc_kb.Cell()
+        cls._model = model = wc_lang.Model()
+        density_units = unit_registry.parse_units('g l^-1')
+        volume_units = unit_registry.parse_units('l')
+        molecule_units = unit_registry.parse_units('molecule')
+        
+        model.parameters.create(id='Avogadro', value = scipy.constants.Avogadro,
+                                units = unit_registry.parse_units('molecule mol^-1'))
 
-        nucleus = cell.compartments.create(id='n')
-        mito = cell.compartments.create(id='m')
-        cytoplasm = cell.compartments.create(id='c')
+        # Create each compartment in the KB and in the model, together with its density and volume
+        kb_comp_by_id = {}
+        comp_by_id = {}
+        compartments = {'n': ('nucleus', 5E-14), 'm': ('mitochondria', 2.5E-14), 'c': ('cytoplasm', 9E-14)}
+        for k, v in compartments.items():
+            kb_comp_by_id[k] = cell.compartments.create(id=k)
+            init_volume = wc_lang.core.InitVolume(distribution=wc_ontology['WC:normal_distribution'], 
+                    mean=v[1], std=0)
+            c = comp_by_id[k] = model.compartments.create(id=k, name=v[0], init_volume=init_volume)
+            c.init_density = model.parameters.create(id='density_' + k, value=1000, 
+                units=density_units)
+            volume = model.functions.create(id='volume_' + k, units=volume_units)
+            volume.expression, error = wc_lang.FunctionExpression.deserialize(f'{c.id} / {c.init_density.id}', {
+                wc_lang.Compartment: {c.id: c},
+                wc_lang.Parameter: {c.init_density.id: c.init_density},
+                })
+            assert error is None, str(error)
+        mito = kb_comp_by_id['m']
+        cytoplasm = kb_comp_by_id['c']
 
-        chr1 = wc_kb.core.DnaSpeciesType(cell=cell, id='chr1', sequence_path=self.sequence_path)
+        chr1 = wc_kb.core.DnaSpeciesType(cell=cell, id='chr1', sequence_path=sequence_path)
         gene1 = wc_kb.eukaryote.GeneLocus(cell=cell, id='gene1', polymer=chr1, start=1, end=18)
         exon1 = wc_kb.eukaryote.GenericLocus(start=4, end=18)
         transcript1 = wc_kb.eukaryote.TranscriptSpeciesType(cell=cell, id='trans1', 
@@ -48,7 +80,7 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
         transcript1_spec = wc_kb.core.Species(species_type=transcript1, compartment=cytoplasm)
         transcript1_conc = wc_kb.core.Concentration(cell=cell, species=transcript1_spec, value=10.)
 
-        chrM = wc_kb.core.DnaSpeciesType(cell=cell, id='chrM', sequence_path=self.sequence_path)
+        chrM = wc_kb.core.DnaSpeciesType(cell=cell, id='chrM', sequence_path=sequence_path)
         gene2 = wc_kb.eukaryote.GeneLocus(cell=cell, id='gene2', polymer=chrM, start=1, end=18)
         exon2 = wc_kb.eukaryote.GenericLocus(start=1, end=10)
         transcript2 = wc_kb.eukaryote.TranscriptSpeciesType(cell=cell, id='trans2', 
@@ -79,92 +111,73 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
         transcript5_spec = wc_kb.core.Species(species_type=transcript5, compartment=mito)
         transcript5_conc = wc_kb.core.Concentration(cell=cell, species=transcript5_spec, value=0.)                   
 
-        # Create initial model content
-        self.model = model = wc_lang.Model()
-        
-        model.parameters.create(id='Avogadro', value = scipy.constants.Avogadro,
-                                units = unit_registry.parse_units('molecule mol^-1'))
-
-        compartments = {'n': ('nucleus', 5E-14), 'm': ('mitochondria', 2.5E-14), 'c': ('cytoplasm', 9E-14)}
-        for k, v in compartments.items():
-            init_volume = wc_lang.core.InitVolume(distribution=wc_ontology['WC:normal_distribution'], 
-                    mean=v[1], std=0)
-            c = model.compartments.create(id=k, name=v[0], init_volume=init_volume)
-            c.init_density = model.parameters.create(id='density_' + k, value=1000, 
-                units=unit_registry.parse_units('g l^-1'))
-            volume = model.functions.create(id='volume_' + k, units=unit_registry.parse_units('l'))
-            volume.expression, error = wc_lang.FunctionExpression.deserialize(f'{c.id} / {c.init_density.id}', {
-                wc_lang.Compartment: {c.id: c},
-                wc_lang.Parameter: {c.init_density.id: c.init_density},
-                })
-            assert error is None, str(error)
-
         for i in cell.species_types.get(__type=wc_kb.eukaryote.TranscriptSpeciesType):
             model_species_type = model.species_types.create(id=i.id, name=i.name)
-            model_compartment = model.compartments.get_one(id='m' if 'M' in i.gene.polymer.id else 'c')
-            model_species = model.species.get_or_create(species_type=model_species_type, compartment=model_compartment)
-            model_species.id = model_species.gen_id()
-            conc_model = model.distribution_init_concentrations.create(species=model_species, 
-                mean=10., units=unit_registry.parse_units('molecule'))
-            conc_model.id = conc_model.gen_id()
-        model.distribution_init_concentrations.get_one(id='dist-init-conc-trans4[m]').mean = 0.
+            model_compartment = comp_by_id['m' if 'M' in i.gene.polymer.id else 'c']
+            model_species = model.species.create(id=f'{model_species_type.id}[{model_compartment.id}]',
+                species_type=model_species_type, compartment=model_compartment)
+            model.distribution_init_concentrations.create(id=f'dist-init-conc-{model_species.id}',
+                species=model_species, mean=0. if i.id == 'trans4' else 10., units=molecule_units)
         ribo_site_species_type = model.species_types.create(id='trans2_ribosome_binding_site')
-        mitochondria = model.compartments.get_one(id='m')
-        ribo_site_species = model.species.create(species_type=ribo_site_species_type, compartment=mitochondria)
+        ribo_site_species = model.species.create(species_type=ribo_site_species_type, compartment=comp_by_id['m'])
         ribo_site_species.id = ribo_site_species.gen_id()
         conc_ribo_site_species = model.distribution_init_concentrations.create(
-            species=ribo_site_species, mean=20, units=unit_registry.parse_units('molecule'))
+            species=ribo_site_species, mean=20, units=molecule_units)
         conc_ribo_site_species.id = conc_ribo_site_species.gen_id()
             
         complexes = {'complex1': ('Exosome', ['c', 'n']), 'complex2': ('Exosome variant', ['c', 'n']), 'complex3': ('Mitochondrial Exosome', ['m']),
             'complex4': ('Mitochondrial Exosome variant', ['m'])}
         for k, v in complexes.items():
-            model_species_type = model.species_types.get_or_create(id=k, name=v[0])
+            model_species_type = model.species_types.create(id=k, name=v[0])
             for comp in v[1]:
-                model_compartment = model.compartments.get_one(id=comp)
-                model_species = model.species.get_or_create(species_type=model_species_type, compartment=model_compartment)
-                model_species.id = model_species.gen_id()
-                conc_model = model.distribution_init_concentrations.create(species=model_species, 
-                    mean=100., units=unit_registry.parse_units('molecule'))
-                conc_model.id = conc_model.gen_id()
+                model_compartment = comp_by_id[comp]
+                model_species = model.species.create(id=f'{model_species_type.id}[{model_compartment.id}]',
+                    species_type=model_species_type, compartment=model_compartment)
+                model.distribution_init_concentrations.create(id=f'dist-init-conc-{model_species.id}',
+                    species=model_species, mean=100., units=molecule_units)
 
         metabolic_participants = ['amp', 'cmp', 'gmp', 'ump', 'h2o', 'h']
         for i in metabolic_participants:
             model_species_type = model.species_types.create(id=i)
             for c in ['n', 'm', 'c']:
-                model_compartment = model.compartments.get_one(id=c)
-                model_species = model.species.get_or_create(species_type=model_species_type, compartment=model_compartment)
-                model_species.id = model_species.gen_id()
-                conc_model = model.distribution_init_concentrations.create(species=model_species, 
-                    mean=1500., units=unit_registry.parse_units('molecule'))
-                conc_model.id = conc_model.gen_id()
+                model_compartment = comp_by_id[c]
+                model_species = model.species.create(id=f'{model_species_type.id}[{model_compartment.id}]',
+                    species_type=model_species_type, compartment=model_compartment)
+                model.distribution_init_concentrations.create(id=f'dist-init-conc-{model_species.id}',
+                    species=model_species, mean=1500., units=molecule_units)
 
-    def tearDown(self):
-        shutil.rmtree(self.tmp_dirname)
-        gvar.transcript_ntp_usage = {}            
+    def setUp(self):
+        self.kb = self._kb.copy()
+        self.model = self._model.copy()
+
+    def set_global_ntp_usage(self, transcript_ntp_usage):
+        self.addCleanup(setattr, gvar, 'transcript_ntp_usage', gvar.transcript_ntp_usage)
+        gvar.transcript_ntp_usage = transcript_ntp_usage
 
     def test_methods(self):
         
+        transcript_ntp_usage = {}
         gen = rna_degradation.RnaDegradationSubmodelGenerator(self.kb, self.model, options={
             'rna_input_seq': {'trans5': 'ACC'},
             'rna_exo_pair': {'trans1': 'Exosome', 'trans2': 'Mitochondrial Exosome', 
                 'trans3': 'Mitochondrial Exosome', 'trans4': 'Mitochondrial Exosome',
                 'trans5': 'Mitochondrial Exosome'},
             'ribosome_occupancy_width': 4,
+            'transcript_ntp_usage': transcript_ntp_usage,
             })
         gen.run()
 
-        self.assertEqual(gvar.transcript_ntp_usage['trans1'], {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15})
-        self.assertEqual(gvar.transcript_ntp_usage['trans5'], {'A': 1, 'U': 0, 'G': 0, 'C': 2, 'len': 3})
+        self.assertEqual(transcript_ntp_usage['trans1'], {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15})
+        self.assertEqual(transcript_ntp_usage['trans5'], {'A': 1, 'U': 0, 'G': 0, 'C': 2, 'len': 3})
 
         # Test gen_reactions
         self.assertEqual([i.id for i in self.model.submodels], ['rna_degradation'])
         self.assertEqual(self.model.submodels.get_one(id='rna_degradation').framework, wc_ontology['WC:next_reaction_method'])
-        self.assertEqual(sorted([i.id for i in self.model.reactions]), 
-            sorted(['degradation_trans1', 'degradation_trans2', 'degradation_trans3', 'degradation_trans4', 'degradation_trans5']))
-        self.assertEqual(sorted([i.name for i in self.model.reactions]), 
-            sorted(['degradation of transcript1', 'degradation of transcript2', 'degradation of transcript3', 
-                'degradation of transcript4', 'degradation of transcript5']))
+        self.assertCountEqual([i.id for i in self.model.reactions], 
+            ['degradation_trans1', 'degradation_trans2', 'degradation_trans3', 'degradation_trans4', 'degradation_trans5'])
+        self.assertCountEqual([i.name for i in self.model.reactions], 
+            ['degradation of transcript1', 'degradation of transcript2', 'degradation of transcript3', 
+                'degradation of transcript4', 'degradation of transcript5'])
         self.assertEqual(set([i.submodel.id for i in self.model.reactions]), set(['rna_degradation']))
         self.assertEqual({i.species.id: i.coefficient for i in self.model.reactions.get_one(id='degradation_trans1').participants}, 
             {'amp[c]': 4, 'cmp[c]': 2, 'gmp[c]': 2, 'ump[c]': 7, 'h[c]': 14, 'h2o[c]': -14, 'trans1[c]': -1})
@@ -202,11 +215,23 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
         self.assertEqual(self.model.parameters.get_one(id='k_cat_degradation_trans4').comments, 
             'Set to the median value because it could not be determined from data')
 
+    def test_ambiguous_exosome_name(self):
+        self.model.species_types.create(id='complex5', name='Mitochondrial Exosome')
+        gen = rna_degradation.RnaDegradationSubmodelGenerator(self.kb, self.model, options={
+            'rna_exo_pair': {'trans1': 'Exosome', 'trans2': 'Mitochondrial Exosome', 
+                'trans3': 'Mitochondrial Exosome', 'trans4': 'Mitochondrial Exosome',
+                'trans5': 'Mitochondrial Exosome'},
+            'ribosome_occupancy_width': 4,    
+            'transcript_ntp_usage': {},
+            })
+        with self.assertRaisesRegex(ValueError, '2 species types are named "Mitochondrial Exosome"'):
+            gen.run()
+
     def test_global_vars(self):
-        gvar.transcript_ntp_usage = {
+        self.set_global_ntp_usage({
             'trans2': {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15},
             'trans5': {'A': 1, 'U': 0, 'G': 0, 'C': 2, 'len': 3},
-            }
+            })
         gen = rna_degradation.RnaDegradationSubmodelGenerator(self.kb, self.model, options={
             'rna_exo_pair': {'trans1': 'Exosome', 'trans2': 'Mitochondrial Exosome', 
                 'trans3': 'Mitochondrial Exosome', 'trans4': 'Mitochondrial Exosome',
@@ -223,3 +248,43 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
             {'amp[m]': 4, 'cmp[m]': 2, 'gmp[m]': 2, 'ump[m]': 7, 'h[m]': 14, 'h2o[m]': -14, 'trans2[m]': -1, 'trans2_ribosome_binding_site[m]': -4})
         self.assertEqual({i.species.id: i.coefficient for i in self.model.reactions.get_one(id='degradation_trans5').participants}, 
             {'amp[m]': 1, 'cmp[m]': 2, 'gmp[m]': 0, 'ump[m]': 0, 'h[m]': 2, 'h2o[m]': -2, 'trans5[m]': -1})
+
+    def test_global_vars_rebound_after_init(self):
+        options = {
+            'rna_exo_pair': {'trans1': 'Exosome', 'trans2': 'Mitochondrial Exosome', 
+                'trans3': 'Mitochondrial Exosome', 'trans4': 'Mitochondrial Exosome',
+                'trans5': 'Mitochondrial Exosome'},
+            'ribosome_occupancy_width': 4,    
+            }
+        gen = rna_degradation.RnaDegradationSubmodelGenerator(self.kb, self.model, options=options)
+        self.assertIsNone(options['transcript_ntp_usage'])
+
+        self.set_global_ntp_usage({
+            'trans2': {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15},
+            })
+        gen.run()
+
+        self.assertEqual(gvar.transcript_ntp_usage['trans1'], {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15})
+        self.assertEqual({i.species.id: i.coefficient for i in self.model.reactions.get_one(id='degradation_trans2').participants}, 
+            {'amp[m]': 4, 'cmp[m]': 2, 'gmp[m]': 2, 'ump[m]': 7, 'h[m]': 14, 'h2o[m]': -14, 'trans2[m]': -1, 'trans2_ribosome_binding_site[m]': -4})
+
+    def test_ntp_usage_option(self):
+        global_ntp_usage = dict(gvar.transcript_ntp_usage)
+        transcript_ntp_usage = {
+            'trans2': {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15},
+            }
+        gen = rna_degradation.RnaDegradationSubmodelGenerator(self.kb, self.model, options={
+            'rna_input_seq': {'trans5': 'ACC'},
+            'rna_exo_pair': {'trans1': 'Exosome', 'trans2': 'Mitochondrial Exosome', 
+                'trans3': 'Mitochondrial Exosome', 'trans4': 'Mitochondrial Exosome',
+                'trans5': 'Mitochondrial Exosome'},
+            'ribosome_occupancy_width': 4,
+            'transcript_ntp_usage': transcript_ntp_usage,
+            })
+        gen.run()
+
+        self.assertEqual(gvar.transcript_ntp_usage, global_ntp_usage)
+        self.assertEqual(transcript_ntp_usage['trans1'], {'A': 4, 'U': 7, 'G': 2, 'C': 2, 'len': 15})
+        self.assertEqual(transcript_ntp_usage['trans5'], {'A': 1, 'U': 0, 'G': 0, 'C': 2, 'len': 3})
+        self.assertEqual({i.species.id: i.coefficient for i in self.model.reactions.get_one(id='degradation_trans2').participants}, 
+            {'amp[m]': 4, 'cmp[m]': 2, 'gmp[m]': 2, 'ump[m]': 7, 'h[m]': 14, 'h2o[m]': -14, 'trans2[m]': -1, 'trans2_ribosome_binding_site[m]': -4})
@@ -1 +1,26 @@
+""" Shared fixtures for the prokaryote tests """
 
+from test.support import EnvironmentVarGuard
+import wc_kb
+
+_min_model_kb = None
+
+
+def read_min_model_kb():
+    """ Read the minimal model KB fixture
+
+    The workbook is only parsed the first time this is called; later calls return
+    copies of the KB that was read then.
+
+    Returns:
+        :obj:`wc_kb.KnowledgeBase`: copy of the knowledge base, which the caller is free to modify
+    """
+    global _min_model_kb
+    if _min_model_kb is None:
+        env = EnvironmentVarGuard()
+        env.set('CONFIG__DOT__wc_kb__DOT__io__DOT__strict', '0')
+        with env:
+            _min_model_kb = wc_kb.io.Reader().run('tests/fixtures/min_model_kb.xlsx',
+                                                  'tests/fixtures/min_model_seq.fna',
+                                                  )[wc_kb.KnowledgeBase][0]
+    return _min_model_kb.copy()
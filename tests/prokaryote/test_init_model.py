@@ -1,4 +1,4 @@
-from test.support import EnvironmentVarGuard
+from . import read_min_model_kb
 from wc_model_gen import prokaryote
 from wc_utils.util.units import unit_registry
 from wc_onto import onto as kbOnt
@@ -10,12 +10,7 @@ class InitalizeModelTestCase(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        env = EnvironmentVarGuard()
-        env.set('CONFIG__DOT__wc_kb__DOT__io__DOT__strict', '0')
-        with env:
-            cls.kb = wc_kb.io.Reader().run('tests/fixtures/min_model_kb.xlsx',
-                                           'tests/fixtures/min_model_seq.fna',
-                                            )[wc_kb.KnowledgeBase][0]
+        cls.kb = read_min_model_kb()
 
         cls.model = prokaryote.ProkaryoteModelGenerator(knowledge_base = cls.kb,
                         component_generators=[prokaryote.InitalizeModel]).run()
@@ -74,3 +69,64 @@ class InitalizeModelTestCase(unittest.TestCase):
             self.assertIsInstance(model_species_type, wc_lang.SpeciesType)
             self.assertIsInstance(model_specie, wc_lang.Species)
             self.assertTrue(conc.units, unit_registry.parse_units('M'))
+
+    def test_half_lives(self):
+        cell = wc_kb.core.Cell()
+        values = ['100.0', '200.0', None, '0', 'nan']
+        half_life_props = []
+        for i_rna, value in enumerate(values):
+            rna = wc_kb.prokaryote.RnaSpeciesType(cell=cell, id='rna{}'.format(i_rna))
+            value_type = kbOnt['WC:string'] if value is None else kbOnt['WC:float']
+            half_life_props.append(wc_kb.core.SpeciesTypeProperty(property='half_life', species_type=rna,
+                value=value, value_type=value_type))
+        rnas = cell.species_types.get(__type=wc_kb.prokaryote.RnaSpeciesType)
+
+        self.assertEqual(prokaryote.InitalizeModel.calc_avg_half_life(rnas), 150.)
+
+        prokaryote.InitalizeModel.fill_missing_half_lives(rnas)
+        self.assertEqual([prop.value for prop in half_life_props], ['100.0', '200.0', '150.0', '150.0', '150.0'])
+
+    def test_gen_species_type_without_run(self):
+        kb = read_min_model_kb()
+        model = wc_lang.Model()
+        for kb_compartment in kb.cell.compartments:
+            model.compartments.create(id=kb_compartment.id)
+        rna_kb = kb.cell.species_types.get(__type=wc_kb.prokaryote.RnaSpeciesType)[0]
+
+        gen = prokaryote.InitalizeModel(kb, model)
+        model_species_type = gen.gen_species_type(rna_kb, ['c'])
+
+        self.assertEqual(model_species_type.id, rna_kb.id)
+        self.assertIn('{}[c]'.format(rna_kb.id), [species.id for species in model_species_type.species])
+
+    def test_kb_without_reactions(self):
+        kb = read_min_model_kb()
+        kb.cell.reactions = []
+
+        model = prokaryote.ProkaryoteModelGenerator(knowledge_base=kb,
+                    component_generators=[prokaryote.InitalizeModel]).run()
+
+        self.assertIsNone(model.submodels.get_one(id='metabolism'))
+        self.assertEqual(len(model.reactions), 0)
+
+    def test_kb_reaction_participant_not_in_model(self):
+        kb = read_min_model_kb()
+        extracellular_space = kb.cell.compartments.get_one(id='e')
+
+        # Find a metabolite that the model does not have in the extracellular space
+        met_kb = next(met_kb for met_kb in kb.cell.species_types.get(__type=wc_kb.core.MetaboliteSpeciesType)
+            if not self.model.species.get_one(id='{}[e]'.format(met_kb.id)))
+
+        kb_species = wc_kb.core.Species(species_type=met_kb, compartment=extracellular_space)
+        kb_rxn = kb.cell.reactions.create(id='test_transport', name='test transport', reversible=False)
+        kb_rxn.participants.append(wc_kb.core.SpeciesCoefficient(species=kb_species, coefficient=-1))
+
+        model = prokaryote.ProkaryoteModelGenerator(knowledge_base=kb,
+                    component_generators=[prokaryote.InitalizeModel]).run()
+
+        model_species = model.species.get_one(id='{}[e]'.format(met_kb.id))
+        self.assertIsInstance(model_species, wc_lang.Species)
+        self.assertEqual(model_species.species_type.id, met_kb.id)
+        self.assertEqual(model_species.compartment.id, 'e')
+        self.assertEqual({i.species.id: i.coefficient for i in model.reactions.get_one(id='test_transport_kb').participants},
+            {'{}[e]'.format(met_kb.id): -1})
@@ -6,7 +6,7 @@
 :License: MIT
 """
 
-from test.support import EnvironmentVarGuard
+from . import read_min_model_kb
 import wc_kb_gen
 from wc_model_gen import prokaryote
 import unittest
@@ -17,12 +17,7 @@ class MetabolismSubmodelGeneratorTestCase(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        env = EnvironmentVarGuard()
-        env.set('CONFIG__DOT__wc_kb__DOT__io__DOT__strict', '0')
-        with env:
-            cls.kb = wc_kb.io.Reader().run('tests/fixtures/min_model_kb.xlsx',
-                                           'tests/fixtures/min_model_seq.fna',
-                                            )[wc_kb.KnowledgeBase][0]
+        cls.kb = read_min_model_kb()
 
         cls.model = prokaryote.ProkaryoteModelGenerator(
                         knowledge_base = cls.kb,
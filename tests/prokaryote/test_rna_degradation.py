@@ -7,7 +7,7 @@
 :License: MIT
 """
 
-from test.support import EnvironmentVarGuard
+from . import read_min_model_kb
 from wc_model_gen import prokaryote
 from wc_onto import onto as wc_ontology
 import math
@@ -21,12 +21,7 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        env = EnvironmentVarGuard()
-        env.set('CONFIG__DOT__wc_kb__DOT__io__DOT__strict', '0')
-        with env:
-            cls.kb = wc_kb.io.Reader().run('tests/fixtures/min_model_kb.xlsx',
-                                           'tests/fixtures/min_model_seq.fna',
-                                            )[wc_kb.KnowledgeBase][0]
+        cls.kb = read_min_model_kb()
 
         cls.model = prokaryote.ProkaryoteModelGenerator(
                         knowledge_base = cls.kb,
@@ -86,7 +81,7 @@ class RnaDegradationSubmodelGeneratorTestCase(unittest.TestCase):
         kb = self.kb
         submodel = model.submodels.get_one(id='rna_degradation')
 
-        modifier_species = model.observables.get_one(id='degrade_rnase_obs').expression.species
+        modifier_species = set(model.observables.get_one(id='degrade_rnase_obs').expression.species)
 
         for rxn in submodel.reactions:
             self.assertEqual(len(rxn.rate_laws), 1)
@@ -7,7 +7,7 @@
 :License: MIT
 """
 
-from test.support import EnvironmentVarGuard
+from . import read_min_model_kb
 from wc_model_gen import prokaryote
 from wc_onto import onto as wc_ontology
 import math
@@ -22,11 +22,7 @@ class TranslationSubmodelGeneratorTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
 
-        env = EnvironmentVarGuard()
-        env.set('CONFIG__DOT__wc_kb__DOT__io__DOT__strict', '0')
-        with env:
-            cls.kb = wc_kb.io.Reader(). run('tests/fixtures/min_model_kb.xlsx',
-                                           'tests/fixtures/min_model_seq.fna')[wc_kb.KnowledgeBase][0]
+        cls.kb = read_min_model_kb()
 
         cls.model = prokaryote.ProkaryoteModelGenerator(
             knowledge_base=cls.kb,
@@ -53,9 +49,11 @@ class TranslationSubmodelGeneratorTestCase(unittest.TestCase):
         cytosol = model.compartments.get_one(id='c')
         submodel = model.submodels.get_one(id='translation')
 
+        st_by_id = {st.id: st for st in model.species_types}
+        sp_by_key = {(sp.species_type.id, sp.compartment.id): sp for sp in model.species}
         for species in kb.cell.species_types.get(__type=wc_kb.prokaryote.ProteinSpeciesType):
-            model_species = model.species_types.get_one(id=species.id)
-            model_species_cytosol = model_species.species.get_one(compartment=cytosol)
+            model_species = st_by_id.get(species.id)
+            model_species_cytosol = sp_by_key.get((species.id, cytosol.id))
             self.assertIsInstance(model_species, wc_lang.SpeciesType)
             self.assertIsInstance(model_species_cytosol, wc_lang.Species)
 
@@ -65,9 +63,10 @@ class TranslationSubmodelGeneratorTestCase(unittest.TestCase):
         cytosol = model.compartments.get_one(id='c')
         submodel = model.submodels.get_one(id='translation')
 
-        gtp = model.species_types.get_one(id='gtp').species.get_one(compartment=cytosol)
-        gdp = model.species_types.get_one(id='gdp').species.get_one(compartment=cytosol)
-        pi = model.species_types.get_one(id='pi').species.get_one(compartment=cytosol)
+        sp_by_key = {(sp.species_type.id, sp.compartment.id): sp for sp in model.species}
+        gtp = sp_by_key[('gtp', cytosol.id)]
+        gdp = sp_by_key[('gdp', cytosol.id)]
+        pi = sp_by_key[('pi', cytosol.id)]
         ribosome = model.observables.get_one(id='ribosome_obs').expression.species[0]
         initiation_factors = model.observables.get_one(id='translation_init_factors_obs').expression.species[0]
         elongation_factors = model.observables.get_one(id='translation_elongation_factors_obs').expression.species[0]
@@ -86,7 +85,6 @@ class TranslationSubmodelGeneratorTestCase(unittest.TestCase):
         # TODO: add assertions about the number of participating tRNAs
         prots_kb = kb.cell.species_types.get(__type=wc_kb.prokaryote.ProteinSpeciesType)
         for rxn, prot_kb in zip(submodel.reactions, prots_kb):
-            prot_model = model.species_types.get_one(id=prot_kb.id)
             length = len(prot_kb.get_seq())
 
             self.assertEqual(rxn.participants.get_one(species=gtp).coefficient, -(length+2))
@@ -10,6 +10,7 @@ from wc_onto import onto as wc_ontology
 from wc_utils.util.units import unit_registry
 import wc_model_gen.utils as utils
 import math
+import numpy
 import scipy.constants
 import unittest
 import wc_lang
@@ -27,6 +28,38 @@ class TestCase(unittest.TestCase):
         test_rate = utils.calc_avg_deg_rate(0.5, 300.)
         self.assertAlmostEqual(test_rate, 0.0011552453009332421, places=16)
 
+        test_rates = utils.calc_avg_deg_rate(numpy.array([0.5, 0.]), numpy.array([300., 600.]))
+        numpy.testing.assert_allclose(test_rates, [0.0011552453009332421, 0.])
+
+        with self.assertRaises(ZeroDivisionError):
+            utils.calc_avg_deg_rate(0.5, 0.)
+        with self.assertRaises(ZeroDivisionError):
+            utils.calc_avg_deg_rate(numpy.array([0.5, 0.]), numpy.array([300., 0.]))
+
+    def test_calc_ntp_count(self):
+
+        self.assertEqual(utils.calc_ntp_count('AUGgcuUUa'), {'A': 2, 'C': 1, 'G': 2, 'U': 4, 'len': 9})
+        self.assertEqual(utils.calc_ntp_count(''), {'A': 0, 'C': 0, 'G': 0, 'U': 0, 'len': 0})
+        self.assertEqual(utils.calc_ntp_count('AUNnGC', extra_letters=['N']),
+            {'A': 1, 'C': 1, 'G': 1, 'U': 1, 'N': 2, 'len': 6})
+
+    def test_get_species_coefficient(self):
+
+        model = wc_lang.Model()
+        compartment = model.compartments.create(id='c')
+        st = model.species_types.create(id='h2o')
+        species = model.species.create(species_type=st, compartment=compartment)
+        existing = species.species_coefficients.create(coefficient=-2)
+
+        cache = {}
+        self.assertIs(utils.get_species_coefficient(species, -2, cache), existing)
+        new = utils.get_species_coefficient(species, 3, cache)
+        self.assertEqual(new.species, species)
+        self.assertEqual(new.coefficient, 3)
+        self.assertIs(utils.get_species_coefficient(species, 3, cache), new)
+        self.assertEqual(len(species.species_coefficients), 2)
+        self.assertEqual(len(cache), 2)
+
     def test_test_metabolite_production(self):
 
         model = wc_lang.Model()
@@ -12,6 +12,7 @@ from wc_onto import onto as wc_ontology
 from wc_utils.util.units import unit_registry
 from wc_utils.util import chem
 import wc_model_gen.global_vars as gvar
+import wc_model_gen.utils as utils
 import ete3
 import math
 import mendeleev
@@ -336,13 +337,7 @@ class InitializeModel(wc_model_gen.ModelComponentGenerator):
         selenoproteome =self.options['selenoproteome']
 
         for Id, seq in rna_input_seq.items():
-            gvar.transcript_ntp_usage[Id] = {
-                'A': seq.upper().count('A'),
-                'C': seq.upper().count('C'),
-                'G': seq.upper().count('G'),
-                'U': seq.upper().count('U'),
-                'len': len(seq)
-                }
+            gvar.transcript_ntp_usage[Id] = utils.calc_ntp_count(seq)
 
     def gen_metabolites(self):
         """ Generate metabolites for the model from knowledge base """
@@ -480,13 +475,7 @@ class InitializeModel(wc_model_gen.ModelComponentGenerator):
                 seq = self.options['rna_input_seq'][model_species_type.id]
             else:
                 seq = kb_species_type.get_seq()
-                gvar.transcript_ntp_usage[model_species_type.id] = {
-                    'A': seq.upper().count('A'),
-                    'C': seq.upper().count('C'),
-                    'G': seq.upper().count('G'),
-                    'U': seq.upper().count('U'),
-                    'len': len(seq)
-                    }
+                gvar.transcript_ntp_usage[model_species_type.id] = utils.calc_ntp_count(seq)
             model_species_type.structure.empirical_formula = kb_species_type.get_empirical_formula(
                 seq_input=seq)
             model_species_type.structure.molecular_weight = kb_species_type.get_mol_wt(
@@ -563,13 +552,7 @@ class InitializeModel(wc_model_gen.ModelComponentGenerator):
                     else:
                         if subunit_id not in gvar.transcript_ntp_usage:
                             seq = subunit.species_type.get_seq()
-                            gvar.transcript_ntp_usage[subunit.species_type.id] = {
-                                'A': seq.upper().count('A'),
-                                'C': seq.upper().count('C'),
-                                'G': seq.upper().count('G'),
-                                'U': seq.upper().count('U'),
-                                'len': len(seq)
-                                }
+                            gvar.transcript_ntp_usage[subunit.species_type.id] = utils.calc_ntp_count(seq)
                         else:
                             seq = self.options['rna_input_seq'][subunit_id]
 
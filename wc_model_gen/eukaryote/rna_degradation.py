@@ -9,6 +9,7 @@ from wc_onto import onto as wc_ontology
 from wc_utils.util.units import unit_registry
 import wc_model_gen.global_vars as gvar
 import wc_model_gen.utils as utils
+import collections
 import math
 import numpy
 import scipy.constants
@@ -31,6 +32,10 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         * ribosome_occupancy_width (:obj:`int`, optional): number of base-pairs 
             on the mRNA occupied by each bound ribosome, 
             the default value is 27 (9 codons)          
+        * transcript_ntp_usage (:obj:`dict`, optional): a dictionary with RNA ids
+            as keys and their NTP counts as values, which is read and updated during
+            generation; if it is not given, the module-level `gvar.transcript_ntp_usage`
+            that is shared with the other eukaryote submodel generators is used
     """
 
     def clean_and_validate_options(self):
@@ -51,6 +56,9 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         ribosome_occupancy_width = options.get('ribosome_occupancy_width', 27)
         options['ribosome_occupancy_width'] = ribosome_occupancy_width    
 
+        transcript_ntp_usage = options.get('transcript_ntp_usage', None)
+        options['transcript_ntp_usage'] = transcript_ntp_usage
+
     def gen_reactions(self):
         """ Generate reactions associated with submodel """
         model = self.model
@@ -60,6 +68,9 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         cytoplasm = model.compartments.get_one(id='c')
 
         rna_input_seq = self.options['rna_input_seq']
+        transcript_ntp_usage = self.options['transcript_ntp_usage']
+        if transcript_ntp_usage is None:
+            transcript_ntp_usage = gvar.transcript_ntp_usage
         
         # Get species involved in reaction
         metabolic_participants = ['amp', 'cmp', 'gmp', 'ump', 'h2o', 'h']
@@ -71,14 +82,23 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
                 'm': met_species_type.species.get_or_create(compartment=mitochondrion, model=model)
                 }
 
+        sc_cache = {}
+
+        st_by_id = {st.id: st for st in model.species_types}
+        sts_by_name = collections.defaultdict(list)
+        for st in model.species_types:
+            sts_by_name[st.name].append(st)
+        species_by_key = {(sp.species_type.id, sp.compartment.id): sp for sp in model.species}
+
         self.submodel.framework = wc_ontology['WC:next_reaction_method']        
 
         print('Start generating RNA degradation submodel...')
         # Create reaction for each RNA and get exosome
         rna_exo_pair = self.options.get('rna_exo_pair')
         ribosome_occupancy_width = self.options['ribosome_occupancy_width']
-        rna_kbs = cell.species_types.get(__type=wc_kb.eukaryote.TranscriptSpeciesType)
+        rna_kbs = self._rna_kbs = cell.species_types.get(__type=wc_kb.eukaryote.TranscriptSpeciesType)
         self._degradation_modifier = {}
+        self._deg_cmp = {}
         deg_rxn_no = 0
         for rna_kb in rna_kbs:  
 
@@ -89,53 +109,49 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
             else:
                 rna_compartment = mitochondrion
                 degradation_compartment = mitochondrion    
+            self._deg_cmp[rna_kb.id] = (rna_compartment, degradation_compartment)
             
-            rna_model = model.species_types.get_one(id=rna_kb.id).species.get_one(compartment=rna_compartment)
+            rna_model = species_by_key[(rna_kb.id, rna_compartment.id)]
             reaction = model.reactions.get_or_create(submodel=self.submodel, id='degradation_' + rna_kb.id)
             reaction.name = 'degradation of ' + rna_kb.name
             
-            if rna_kb.id in gvar.transcript_ntp_usage:
-                ntp_count = gvar.transcript_ntp_usage[rna_kb.id]
+            if rna_kb.id in transcript_ntp_usage:
+                ntp_count = transcript_ntp_usage[rna_kb.id]
             else:
                 if rna_kb.id in rna_input_seq:
                     seq = rna_input_seq[rna_kb.id]
                 else:    
                     seq = rna_kb.get_seq()
-                ntp_count = gvar.transcript_ntp_usage[rna_kb.id] = {
-                    'A': seq.upper().count('A'),
-                    'C': seq.upper().count('C'),
-                    'G': seq.upper().count('G'),
-                    'U': seq.upper().count('U'),
-                    'len': len(seq)
-                    }
+                ntp_count = transcript_ntp_usage[rna_kb.id] = utils.calc_ntp_count(seq)
             
             # Adding participants to LHS
-            reaction.participants.append(rna_model.species_coefficients.get_or_create(coefficient=-1))
-            reaction.participants.append(metabolites['h2o'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=-(ntp_count['len']-1)))
+            reaction.participants.append(utils.get_species_coefficient(rna_model, -1, sc_cache))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['h2o'][degradation_compartment.id], -(ntp_count['len']-1), sc_cache))
 
-            ribo_binding_site_st = model.species_types.get_one(id='{}_ribosome_binding_site'.format(rna_kb.id))
+            ribo_binding_site_st = st_by_id.get('{}_ribosome_binding_site'.format(rna_kb.id))
             if ribo_binding_site_st:
                 ribo_binding_site_species = ribo_binding_site_st.species[0]
                 site_per_rna = math.floor(ntp_count['len']/ribosome_occupancy_width) + 1
-                reaction.participants.append(ribo_binding_site_species.species_coefficients.get_or_create(
-                    coefficient=-site_per_rna))
+                reaction.participants.append(utils.get_species_coefficient(ribo_binding_site_species, -site_per_rna, sc_cache))
 
             # Adding participants to RHS
-            reaction.participants.append(metabolites['amp'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=ntp_count['A']))
-            reaction.participants.append(metabolites['cmp'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=ntp_count['C']))
-            reaction.participants.append(metabolites['gmp'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=ntp_count['G']))
-            reaction.participants.append(metabolites['ump'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=ntp_count['U']))
-            reaction.participants.append(metabolites['h'][
-                degradation_compartment.id].species_coefficients.get_or_create(coefficient=ntp_count['len']-1))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['amp'][degradation_compartment.id], ntp_count['A'], sc_cache))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['cmp'][degradation_compartment.id], ntp_count['C'], sc_cache))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['gmp'][degradation_compartment.id], ntp_count['G'], sc_cache))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['ump'][degradation_compartment.id], ntp_count['U'], sc_cache))
+            reaction.participants.append(utils.get_species_coefficient(
+                metabolites['h'][degradation_compartment.id], ntp_count['len']-1, sc_cache))
                              
             # Assign modifier
-            self._degradation_modifier[reaction.name] = model.species_types.get_one(
-                name=rna_exo_pair[rna_kb.id]).species.get_one(compartment=degradation_compartment)
+            exo_sts = sts_by_name[rna_exo_pair[rna_kb.id]]
+            if len(exo_sts) != 1:
+                raise ValueError('{} species types are named "{}"'.format(len(exo_sts), rna_exo_pair[rna_kb.id]))
+            self._degradation_modifier[reaction.name] = species_by_key[(exo_sts[0].id, degradation_compartment.id)]
 
             deg_rxn_no += 1
         print('{} RNA degradation reactions have been generated'.format(deg_rxn_no))                
@@ -143,29 +159,24 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
     def gen_rate_laws(self):
         """ Generate rate laws for the reactions in the submodel """
         model = self.model        
-        cell = self.knowledge_base.cell
-        nucleus = model.compartments.get_one(id='n')
-        mitochondrion = model.compartments.get_one(id='m')
-        cytoplasm = model.compartments.get_one(id='c')
+
+        st_by_id = {st.id: st for st in model.species_types}
+        h2o_by_cid = {sp.compartment.id: sp for sp in st_by_id['h2o'].species}
+
+        rxn_by_id = {rxn.id: rxn for rxn in self.submodel.reactions}
 
         rate_law_no = 0
-        rnas_kb = cell.species_types.get(__type=wc_kb.eukaryote.TranscriptSpeciesType)
-        for rna_kb in rnas_kb:
+        for rna_kb in self._rna_kbs:
 
-            reaction = self.submodel.reactions.get_one(id='degradation_{}'.format(rna_kb.id))
+            reaction = rxn_by_id['degradation_{}'.format(rna_kb.id)]
 
-            rna_kb_compartment_id = rna_kb.species[0].compartment.id
-            if rna_kb_compartment_id == 'c':
-                degradation_compartment = cytoplasm
-            else:
-                degradation_compartment = mitochondrion 
+            _, degradation_compartment = self._deg_cmp[rna_kb.id]
 
             modifier = self._degradation_modifier[reaction.name]
 
-            h2o_species = model.species_types.get_one(id='h2o').species.get_one(
-                compartment=degradation_compartment)
+            h2o_species = h2o_by_cid[degradation_compartment.id]
 
-            ribo_binding_site_st = model.species_types.get_one(id='{}_ribosome_binding_site'.format(rna_kb.id))
+            ribo_binding_site_st = st_by_id.get('{}_ribosome_binding_site'.format(rna_kb.id))
             if ribo_binding_site_st:
                 ribo_binding_site_species = ribo_binding_site_st.species[0]
                 exclude_substrates = [ribo_binding_site_species, h2o_species]
@@ -190,10 +201,6 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         """ Calibrate the submodel using data in the KB """
         
         model = self.model        
-        cell = self.knowledge_base.cell
-        nucleus = model.compartments.get_one(id='n')
-        mitochondrion = model.compartments.get_one(id='m')
-        cytoplasm = model.compartments.get_one(id='c')
 
         beta = self.options.get('beta')
 
@@ -203,71 +210,87 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
             value=scipy.constants.Avogadro,
             units=unit_registry.parse_units('molecule mol^-1'))       
 
-        rnas_kb = cell.species_types.get(__type=wc_kb.eukaryote.TranscriptSpeciesType)
-        undetermined_model_kcat = []
-        determined_kcat = []
-        for rna_kb, reaction in zip(rnas_kb, self.submodel.reactions):
+        species_by_key = {(sp.species_type.id, sp.compartment.id): sp for sp in model.species}
+        rxn_by_id = {rxn.id: rxn for rxn in self.submodel.reactions}
+        param_by_id = {param.id: param for param in model.parameters}
 
-            init_species_counts = {}
+        # Estimate the K_m values of all the reactions in one step, before the rate laws are evaluated
+        model_Kms = []
+        Km_species = []
+        for rna_kb in self._rna_kbs:
+            reaction = rxn_by_id['degradation_{}'.format(rna_kb.id)]
+            for species in reaction.get_reactants():
+                model_Km = param_by_id.get('K_m_{}_{}'.format(reaction.id, species.species_type.id))
+                if model_Km:
+                    model_Kms.append(model_Km)
+                    Km_species.append(species)
+
+        means = numpy.fromiter((species.distribution_init_concentration.mean or 0. for species in Km_species),
+            dtype=float, count=len(Km_species))
+        volumes = numpy.fromiter((species.compartment.init_volume.mean for species in Km_species),
+            dtype=float, count=len(Km_species))
+        has_conc = means != 0
+        Km_values = numpy.full(len(Km_species), 1e-05)
+        Km_values[has_conc] = beta * means[has_conc] / Avogadro.value / volumes[has_conc]
+
+        for model_Km, species, Km_value, is_conc in zip(model_Kms, Km_species, Km_values, has_conc):
+            model_Km.value = float(Km_value)
+            if is_conc:
+                model_Km.comments = 'The value was assumed to be {} times the concentration of {} in {}'.format(
+                    beta, species.species_type.id, species.compartment.name)
+            else:
+                model_Km.comments = 'The value was assigned to 1e-05 because the concentration of ' +\
+                    '{} in {} was zero'.format(species.species_type.id, species.compartment.name)
+
+        compartment_volumes = {compartment.id: compartment.init_volume.mean * compartment.init_density.value
+            for compartments in self._deg_cmp.values() for compartment in compartments}
+        init_species_counts = {}
+        rate_law_values = {
+            wc_lang.Species: init_species_counts,
+            wc_lang.Compartment: compartment_volumes,
+            }
+
+        # Calculate the measured degradation rates of all the RNAs in one step
+        rna_reactants = [species_by_key[(rna_kb.id, self._deg_cmp[rna_kb.id][0].id)] for rna_kb in self._rna_kbs]
+        half_lives = numpy.fromiter((rna_kb.properties.get_one(property='half-life').get_value()
+            for rna_kb in self._rna_kbs), dtype=float, count=len(self._rna_kbs))
+        mean_concentrations = numpy.fromiter((rna_reactant.distribution_init_concentration.mean
+            for rna_reactant in rna_reactants), dtype=float, count=len(rna_reactants))
+        average_rates = utils.calc_avg_deg_rate(mean_concentrations, half_lives)
+
+        model_kcats = []
+        eval_rate_laws = numpy.zeros(len(self._rna_kbs))
+        for i_rna, rna_kb in enumerate(self._rna_kbs):
+
+            reaction = rxn_by_id['degradation_{}'.format(rna_kb.id)]
+
+            init_species_counts.clear()
         
             modifier_species = self._degradation_modifier[reaction.name]      
-            init_species_counts[modifier_species.gen_id()] = modifier_species.distribution_init_concentration.mean
-                    
-            rna_kb_compartment_id = rna_kb.species[0].compartment.id
-            if rna_kb_compartment_id == 'c':
-                rna_compartment = cytoplasm
-                degradation_compartment = cytoplasm
-            else:
-                rna_compartment = mitochondrion
-                degradation_compartment = mitochondrion 
+            for species in (modifier_species, *reaction.get_reactants()):
+                init_species_counts[species.gen_id()] = species.distribution_init_concentration.mean
 
-            rna_reactant = model.species_types.get_one(id=rna_kb.id).species.get_one(compartment=rna_compartment)
+            model_kcat = param_by_id.get('k_cat_{}'.format(reaction.id))
 
-            half_life = rna_kb.properties.get_one(property='half-life').get_value()
-            mean_concentration = rna_reactant.distribution_init_concentration.mean
+            eval_rate_law = 0.
+            if average_rates[i_rna]:            
+                model_kcat.value = 1.
+                eval_rate_law = reaction.rate_laws[0].expression._parsed_expression.eval(rate_law_values)
 
-            average_rate = utils.calc_avg_deg_rate(mean_concentration, half_life)
-            
-            for species in reaction.get_reactants():
+            model_kcats.append(model_kcat)
+            eval_rate_laws[i_rna] = eval_rate_law
 
-                init_species_counts[species.gen_id()] = species.distribution_init_concentration.mean
+        # Divide the measured rates by the rate laws evaluated with k_cat = 1 in one step
+        determined = (average_rates != 0) & (eval_rate_laws != 0)
+        kcats = numpy.zeros(len(model_kcats))
+        kcats[determined] = average_rates[determined] / eval_rate_laws[determined]
 
-                if model.parameters.get(id='K_m_{}_{}'.format(reaction.id, species.species_type.id)):
-                    model_Km = model.parameters.get_one(
-                        id='K_m_{}_{}'.format(reaction.id, species.species_type.id))
-                    if species.distribution_init_concentration.mean:
-                        model_Km.value = beta * species.distribution_init_concentration.mean \
-                            / Avogadro.value / species.compartment.init_volume.mean
-                        model_Km.comments = 'The value was assumed to be {} times the concentration of {} in {}'.format(
-                            beta, species.species_type.id, species.compartment.name)
-                    else:
-                        model_Km.value = 1e-05
-                        model_Km.comments = 'The value was assigned to 1e-05 because the concentration of ' +\
-                            '{} in {} was zero'.format(species.species_type.id, species.compartment.name)
-
-            model_kcat = model.parameters.get_one(id='k_cat_{}'.format(reaction.id))
-
-            if average_rate:            
-                model_kcat.value = 1.
-                eval_rate_law = reaction.rate_laws[0].expression._parsed_expression.eval({
-                    wc_lang.Species: init_species_counts,
-                    wc_lang.Compartment: {
-                        rna_compartment.id: rna_compartment.init_volume.mean * \
-                            rna_compartment.init_density.value,
-                        degradation_compartment.id: degradation_compartment.init_volume.mean * \
-                            degradation_compartment.init_density.value}
-                    })
-                if eval_rate_law:
-                    model_kcat.value = average_rate / eval_rate_law
-                    determined_kcat.append(model_kcat.value)
-                else:
-                    undetermined_model_kcat.append(model_kcat)    
-            else:          
-                undetermined_model_kcat.append(model_kcat)
-        
-        median_kcat = numpy.median(determined_kcat)
-        for model_kcat in undetermined_model_kcat:
-            model_kcat.value = median_kcat
-            model_kcat.comments = 'Set to the median value because it could not be determined from data'       
+        median_kcat = numpy.median(kcats[determined])
+        for model_kcat, kcat, is_determined in zip(model_kcats, kcats, determined):
+            if is_determined:
+                model_kcat.value = float(kcat)
+            else:
+                model_kcat.value = median_kcat
+                model_kcat.comments = 'Set to the median value because it could not be determined from data'       
 
         print('RNA degradation submodel has been generated')           
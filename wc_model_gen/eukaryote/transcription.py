@@ -344,13 +344,7 @@ class TranscriptionSubmodelGenerator(wc_model_gen.SubmodelGenerator):
                             seq = rna_input_seq[add_transcript]
                         else:
                             seq = cell.species_types.get_one(id=add_transcript).get_seq()    
-                        add_count = gvar.transcript_ntp_usage[add_transcript] = {
-                            'A': seq.upper().count('A'),
-                            'C': seq.upper().count('C'),
-                            'G': seq.upper().count('G'),
-                            'U': seq.upper().count('U'),
-                            'len': len(seq),
-                            }
+                        add_count = gvar.transcript_ntp_usage[add_transcript] = utils.calc_ntp_count(seq)
                     add_seq = {k:v+add_count[k] for k,v in add_seq.items()}
             
             # Create initiation reaction
@@ -463,14 +457,7 @@ class TranscriptionSubmodelGenerator(wc_model_gen.SubmodelGenerator):
                 pre_rna_seq = gene_seq.transcribe()
             else:
                 pre_rna_seq = gene_seq.reverse_complement().transcribe()
-            pre_rna_count = {
-                'A': pre_rna_seq.upper().count('A'),
-                'C': pre_rna_seq.upper().count('C'),
-                'G': pre_rna_seq.upper().count('G'),
-                'U': pre_rna_seq.upper().count('U'),
-                'N': pre_rna_seq.upper().count('N'),
-                'len': len(pre_rna_seq),
-                }
+            pre_rna_count = utils.calc_ntp_count(pre_rna_seq, extra_letters=['N'])
             
             if rna_kb.id in gvar.transcript_ntp_usage:
                 ntp_count = gvar.transcript_ntp_usage[rna_kb.id]
@@ -479,13 +466,7 @@ class TranscriptionSubmodelGenerator(wc_model_gen.SubmodelGenerator):
                     seq = rna_input_seq[rna_kb.id]
                 else:    
                     seq = rna_kb.get_seq()
-                ntp_count = gvar.transcript_ntp_usage[rna_kb.id] = {
-                    'A': seq.upper().count('A'),
-                    'C': seq.upper().count('C'),
-                    'G': seq.upper().count('G'),
-                    'U': seq.upper().count('U'),
-                    'len': len(seq),
-                    }
+                ntp_count = gvar.transcript_ntp_usage[rna_kb.id] = utils.calc_ntp_count(seq)
 
             if add_seq:
                 pre_rna_count = {k:(v+add_seq[k] if k in add_seq else v) for k,v in pre_rna_count.items()}
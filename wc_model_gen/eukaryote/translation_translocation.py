@@ -269,13 +269,7 @@ class TranslationTranslocationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
             else:
                 seq = mrna_kb.get_seq()
                 mrna_len = len(seq)
-                ntp_count = gvar.transcript_ntp_usage[mrna_kb.id] = {
-                    'A': seq.upper().count('A'),
-                    'C': seq.upper().count('C'),
-                    'G': seq.upper().count('G'),
-                    'U': seq.upper().count('U'),
-                    'len': mrna_len
-                    }
+                ntp_count = gvar.transcript_ntp_usage[mrna_kb.id] = utils.calc_ntp_count(seq)
 
             aa_content = {}
             if mrna_kb.protein.id in gvar.protein_aa_usage:                                        
@@ -1477,13 +1471,7 @@ class TranslationTranslocationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
                     ntp_count = gvar.transcript_ntp_usage[trna_id]
                 else:
                     seq = rna_kb.get_seq()
-                    ntp_count = gvar.transcript_ntp_usage[trna_id] = {
-                        'A': seq.upper().count('A'),
-                        'C': seq.upper().count('C'),
-                        'G': seq.upper().count('G'),
-                        'U': seq.upper().count('U'),
-                        'len': len(seq)
-                        }                
+                    ntp_count = gvar.transcript_ntp_usage[trna_id] = utils.calc_ntp_count(seq)
                 # Adding participants to LHS
                 reaction.participants.append(mito_trna_species.species_coefficients.get_or_create(
                     coefficient=-1))
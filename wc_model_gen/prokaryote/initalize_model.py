@@ -18,7 +18,26 @@ import scipy.constants
 import wc_kb
 import wc_lang
 import wc_model_gen
-from wc_onto import onto as wc_ontology
+
+K_M_TYPE = wc_ontology['WC:K_m']
+K_CAT_TYPE = wc_ontology['WC:k_cat']
+METABOLITE_TYPE = wc_ontology['WC:metabolite']
+DNA_TYPE = wc_ontology['WC:DNA']
+RNA_TYPE = wc_ontology['WC:RNA']
+PROTEIN_TYPE = wc_ontology['WC:protein']
+
+# model species type and structure of each class of KB species types
+SPECIES_TYPE_DISPATCH = {
+    wc_kb.core.MetaboliteSpeciesType: (METABOLITE_TYPE, lambda kb_species_type: wc_lang.core.ChemicalStructure(
+        value=kb_species_type.properties.get_one(property='structure').get_value())),
+    wc_kb.core.DnaSpeciesType: (DNA_TYPE, lambda kb_species_type: wc_lang.core.ChemicalStructure(
+        value=kb_species_type.get_seq())),
+    wc_kb.prokaryote.RnaSpeciesType: (RNA_TYPE, lambda kb_species_type: wc_lang.core.ChemicalStructure(
+        value=kb_species_type.get_seq())),
+    wc_kb.prokaryote.ProteinSpeciesType: (PROTEIN_TYPE, lambda kb_species_type: wc_lang.core.ChemicalStructure(
+        value=kb_species_type.get_seq())),
+    wc_kb.core.ComplexSpeciesType: (PROTEIN_TYPE, lambda kb_species_type: wc_lang.core.ChemicalStructure()),
+}
 
 
 class InitalizeModel(wc_model_gen.ModelComponentGenerator):
@@ -31,6 +50,10 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         self.clean_and_validate_options()
         options = self.options
 
+        self.group_kb_species_types()
+        self._cmp_by_id = None
+        self._species_index = None
+
         if options['gen_metabolites']:
             self.gen_metabolites()
 
@@ -96,28 +119,31 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         model = self.model
 
         # TODO: get volume from KB, talk to YH
-        c_init_volume  = wc_lang.core.InitVolume(distribution=wc_ontology['WC:normal_distribution'], mean=1E-15, std=0)
-        c = model.compartments.get_or_create(id='c', name='Cytosol', init_volume=c_init_volume)
-        c.init_density = model.parameters.create(id='density_c', value=1100., units=unit_registry.parse_units('g l^-1'))
-        volume_c = model.functions.create(id='volume_c', units=unit_registry.parse_units('l'))
-
-        volume_c.expression, error = wc_lang.FunctionExpression.deserialize(f'{c.id} / {c.init_density.id}', {
-            wc_lang.Compartment: {c.id: c},
-            wc_lang.Parameter: {c.init_density.id: c.init_density},
-            })
-        assert error is None, str(error)
-
-        # Extracellular space
-        e_init_volume  = wc_lang.core.InitVolume(distribution=wc_ontology['WC:normal_distribution'], mean=1E-10, std=0)
-
-        e = model.compartments.get_or_create(id='e', name='Extracellular space', init_volume=e_init_volume)
-        e.init_density = model.parameters.create(id='density_e', value=1000., units=unit_registry.parse_units('g l^-1'))
-        volume_e = model.functions.create(id='volume_e', units=unit_registry.parse_units('l'))
-        volume_e.expression, error = wc_lang.FunctionExpression.deserialize(f'{e.id} / {e.init_density.id}', {
-            wc_lang.Compartment: {e.id: e},
-            wc_lang.Parameter: {e.init_density.id: e.init_density},
-        })
-        assert error is None, str(error)
+        compartment_specs = [
+            # id, name, initial volume (l), density (g l^-1)
+            ('c', 'Cytosol', 1E-15, 1100.),
+            ('e', 'Extracellular space', 1E-10, 1000.),
+        ]
+
+        density_units = unit_registry.parse_units('g l^-1')
+        volume_units = unit_registry.parse_units('l')
+        objects = {
+            wc_lang.Compartment: {},
+            wc_lang.Parameter: {},
+            }
+        for compartment_id, name, mean_volume, density in compartment_specs:
+            init_volume = wc_lang.core.InitVolume(distribution=wc_ontology['WC:normal_distribution'],
+                                                  mean=mean_volume, std=0)
+            compartment = model.compartments.get_or_create(id=compartment_id, name=name, init_volume=init_volume)
+            compartment.init_density = model.parameters.create(id=f'density_{compartment_id}', value=density,
+                                                               units=density_units)
+            volume = model.functions.create(id=f'volume_{compartment_id}', units=volume_units)
+
+            objects[wc_lang.Compartment][compartment.id] = compartment
+            objects[wc_lang.Parameter][compartment.init_density.id] = compartment.init_density
+            volume.expression, error = wc_lang.FunctionExpression.deserialize(
+                f'{compartment.id} / {compartment.init_density.id}', objects)
+            assert error is None, str(error)
 
     def gen_parameters(self):
         kb = self.knowledge_base
@@ -140,19 +166,56 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
                             value=param.value,
                             units=param.units)
             if 'K_m' in param.id:
-                model_param.type = wc_ontology['WC:K_m']
+                model_param.type = K_M_TYPE
             elif 'k_cat' in param.id:
-                model_param.type = wc_ontology['WC:k_cat']
+                model_param.type = K_CAT_TYPE
             else:
                 model_param.type = None
 
+    def group_kb_species_types(self):
+        """ Group the species types of the knowledge base by class in a single pass, for use by
+        the generators of the metabolites, RNAs, proteins and complexes """
+        species_type_classes = [
+            wc_kb.core.MetaboliteSpeciesType,
+            wc_kb.prokaryote.RnaSpeciesType,
+            wc_kb.prokaryote.ProteinSpeciesType,
+            wc_kb.core.ComplexSpeciesType,
+        ]
+
+        self._kb_species_types = {cls: [] for cls in species_type_classes}
+        for kb_species_type in self.knowledge_base.cell.species_types:
+            for cls in species_type_classes:
+                if isinstance(kb_species_type, cls):
+                    self._kb_species_types[cls].append(kb_species_type)
+
+    def _get_compartments_by_id(self):
+        """ Get the model compartments keyed by their ids; the compartments of the model are
+        indexed the first time this is called
+
+        Returns:
+            :obj:`dict`: model compartments, keyed by their ids
+        """
+        if getattr(self, '_cmp_by_id', None) is None:
+            self._cmp_by_id = {c.id: c for c in self.model.compartments}
+        return self._cmp_by_id
+
+    def _get_species_index(self):
+        """ Get the model species keyed by the ids of their species types and compartments; the
+        species of the model are indexed the first time this is called
+
+        Returns:
+            :obj:`dict`: model species, keyed by the ids of their species types and compartments
+        """
+        if getattr(self, '_species_index', None) is None:
+            self._species_index = {(sp.species_type.id, sp.compartment.id): sp for sp in self.model.species}
+        return self._species_index
+
     def gen_metabolites(self):
         """ Generate all metabolic species in the cytosol """
         kb = self.knowledge_base
         model = self.model
 
-        kb_species_types = kb.cell.species_types.get(
-            __type=wc_kb.core.MetaboliteSpeciesType)
+        kb_species_types = self._kb_species_types[wc_kb.core.MetaboliteSpeciesType]
 
         for kb_species_type in kb_species_types:
             self.gen_species_type(kb_species_type)
@@ -164,16 +227,11 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         kb = self.knowledge_base
         model = self.model
 
-        kb_species_types = kb.cell.species_types.get(__type=wc_kb.prokaryote.RnaSpeciesType)
-        avg_rna_half_life = self.calc_avg_half_life(kb_species_types=kb_species_types)
+        kb_species_types = self._kb_species_types[wc_kb.prokaryote.RnaSpeciesType]
+        self.fill_missing_half_lives(kb_species_types)
 
         # Create RNA species
         for kb_species_type in kb_species_types:
-            half_life = kb_species_type.properties.get_one(property='half_life').get_value()
-
-            if half_life is None or half_life==0:
-                kb_species_type.properties.get_one(property='half_life').value = str(avg_rna_half_life)
-
             self.gen_species_type(kb_species_type, ['c'])
 
 
@@ -184,35 +242,51 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         kb = self.knowledge_base
         model = self.model
 
-        kb_species_types = kb.cell.species_types.get(__type=wc_kb.prokaryote.ProteinSpeciesType)
-        avg_prot_half_life = self.calc_avg_half_life(kb_species_types=kb_species_types)
+        kb_species_types = self._kb_species_types[wc_kb.prokaryote.ProteinSpeciesType]
+        self.fill_missing_half_lives(kb_species_types)
 
         # Create protein species
         for kb_species_type in kb_species_types:
-            half_life = kb_species_type.properties.get_one(property='half_life').get_value()
-
-            if half_life is None or half_life==0:
-                kb_species_type.properties.get_one(property='half_life').value = str(avg_prot_half_life)
-
             self.gen_species_type(kb_species_type, ['c'])
 
     @staticmethod
     def calc_avg_half_life(kb_species_types):
+        """ Calculate the average half-life of species types, leaving out the half-lives
+        that are missing, zero or NaN
 
-        half_lifes = []
-        for kb_species_type in kb_species_types:
-            half_life = kb_species_type.properties.get_one(property='half_life').get_value()
-            if (half_life != 0) and (half_life is not None):
-                half_lifes.append(half_life)
+        Args:
+            kb_species_types (:obj:`list` of :obj:`wc_kb.core.SpeciesType`): knowledge base species types
 
-        return round(numpy.mean(half_lifes),3)
+        Returns:
+            :obj:`float`: average half-life, rounded to 3 decimals
+        """
+        half_lives = numpy.array([kb_species_type.properties.get_one(property='half_life').get_value()
+                                  for kb_species_type in kb_species_types], dtype=float)
+
+        return round(numpy.mean(half_lives[numpy.isfinite(half_lives) & (half_lives != 0)]),3)
+
+    @staticmethod
+    def fill_missing_half_lives(kb_species_types):
+        """ Set the half-lives of species types whose half-life is missing, zero or NaN to the
+        average half-life of the other species types
+
+        Args:
+            kb_species_types (:obj:`list` of :obj:`wc_kb.core.SpeciesType`): knowledge base species types
+        """
+        avg_half_life = InitalizeModel.calc_avg_half_life(kb_species_types)
+
+        for kb_species_type in kb_species_types:
+            half_life_prop = kb_species_type.properties.get_one(property='half_life')
+            half_life = half_life_prop.get_value()
+            if half_life is None or half_life == 0 or math.isnan(half_life):
+                half_life_prop.value = str(avg_half_life)
 
     def gen_complexes(self):
         """ Generate complexes in model from knowledge base """
         kb = self.knowledge_base
         model = self.model
 
-        kb_species_types = kb.cell.species_types.get(__type=wc_kb.core.ComplexSpeciesType)
+        kb_species_types = self._kb_species_types[wc_kb.core.ComplexSpeciesType]
         for kb_species_type in kb_species_types:
             self.gen_species_type(kb_species_type, ['c'])
 
@@ -232,44 +306,39 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         model_species_type = model.species_types.get_or_create(id=kb_species_type.id)
         model_species_type.name = kb_species_type.name
 
-        if isinstance(kb_species_type, wc_kb.core.MetaboliteSpeciesType):
-            model_species_type.type = wc_ontology['WC:metabolite'] # metabolite
-            inchi_str = kb_species_type.properties.get_one(property='structure').get_value()
-            model_species_type.structure = wc_lang.core.ChemicalStructure(value=inchi_str)
-
-        elif isinstance(kb_species_type, wc_kb.core.DnaSpeciesType):
-            model_species_type.type = wc_ontology['WC:DNA'] # DNA
-            model_species_type.structure = wc_lang.core.ChemicalStructure(value=kb_species_type.get_seq()) #kb_species_type.get_seq()
-
-        elif isinstance(kb_species_type, wc_kb.prokaryote.RnaSpeciesType):
-            model_species_type.type = wc_ontology['WC:RNA'] # RNA
-            model_species_type.structure =  wc_lang.core.ChemicalStructure(value=kb_species_type.get_seq())
-
-        elif isinstance(kb_species_type, wc_kb.prokaryote.ProteinSpeciesType):
-            model_species_type.type = wc_ontology['WC:protein'] # protein
-            model_species_type.structure = wc_lang.core.ChemicalStructure(value=kb_species_type.get_seq())
-
-        elif isinstance(kb_species_type, wc_kb.core.ComplexSpeciesType):
-            model_species_type.type = wc_ontology['WC:protein'] # protein
-            model_species_type.structure = wc_lang.core.ChemicalStructure()
-
+        # dispatch on the most specific class of the species type, so that subclasses are also supported
+        for cls in type(kb_species_type).__mro__:
+            if cls in SPECIES_TYPE_DISPATCH:
+                break
         else:
             raise ValueError('Unsupported species type: {}'.format(
                 kb_species_type.__class__.__name__))
 
-        if kb_species_type.get_empirical_formula():
-            model_species_type.structure.empirical_formula = EmpiricalFormula(kb_species_type.get_empirical_formula())
+        model_species_type.type, gen_structure = SPECIES_TYPE_DISPATCH[cls]
+        model_species_type.structure = gen_structure(kb_species_type)
+
+        empirical_formula = kb_species_type.get_empirical_formula()
+        if empirical_formula:
+            model_species_type.structure.empirical_formula = EmpiricalFormula(empirical_formula)
 
         model_species_type.structure.molecular_weight = kb_species_type.get_mol_wt()
         model_species_type.structure.charge = kb_species_type.get_charge()
         model_species_type.comments = kb_species_type.comments
-        compartment_ids = set([s.compartment.id for s in kb_species_type.species] +
-                              (extra_compartment_ids or []))
+        compartment_ids = {s.compartment.id for s in kb_species_type.species}
+        if extra_compartment_ids:
+            compartment_ids.update(extra_compartment_ids)
 
+        cmp_by_id = self._get_compartments_by_id()
+        sp_index = self._get_species_index()
         for compartment_id in compartment_ids:
-            model_compartment = model.compartments.get_one(id=compartment_id)
-            model_species = model.species.get_or_create(species_type=model_species_type, compartment=model_compartment)
-            model_species.id = model_species.gen_id()
+            model_compartment = cmp_by_id[compartment_id]
+            key = (model_species_type.id, model_compartment.id)
+            model_species = sp_index.get(key)
+            if model_species is None:
+                model_species = sp_index[key] = model.species.create(
+                    species_type=model_species_type, compartment=model_compartment)
+            if not model_species.id:
+                model_species.id = model_species.gen_id()
 
         return model_species_type
 
@@ -281,12 +350,23 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
 
         Avogadro = model.parameters.get_one(id='Avogadro')
 
-        for conc in kb.cell.concentrations:
-            species_comp_model = model.compartments.get_one(id=conc.species.compartment.id)
+        cmp_by_id = self._get_compartments_by_id()
+        st_by_id = {st.id: st for st in model.species_types}
+        sp_index = self._get_species_index()
 
-            species_type = model.species_types.get_or_create(id=conc.species.species_type.id)
-            species = model.species.get_or_create(species_type=species_type, compartment=species_comp_model)
-            species.id = species.gen_id()
+        for conc in kb.cell.concentrations:
+            species_comp_model = cmp_by_id[conc.species.compartment.id]
+
+            species_type = st_by_id.get(conc.species.species_type.id)
+            if species_type is None:
+                species_type = st_by_id[conc.species.species_type.id] = model.species_types.create(
+                    id=conc.species.species_type.id)
+            species = sp_index.get((species_type.id, species_comp_model.id))
+            if species is None:
+                species = sp_index[(species_type.id, species_comp_model.id)] = model.species.create(
+                    species_type=species_type, compartment=species_comp_model)
+            if not species.id:
+                species.id = species.gen_id()
 
             if conc.units == unit_registry.parse_units('molecule'):
                 mean_concentration = conc.value
@@ -307,17 +387,14 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         kb = self.knowledge_base
         model = self.model
 
+        sp_index = self._get_species_index()
+
         for kb_observable in kb.cell.observables:
             all_species = {}
             all_observables = {}
 
             for kb_species in kb_observable.expression.species:
-                kb_species_type = kb_species.species_type
-                kb_compartment = kb_species.compartment
-                model_species_type = model.species_types.get_one(
-                    id=kb_species_type.id)
-                model_species = model_species_type.species.get_one(
-                    compartment=model.compartments.get_one(id=kb_compartment.id))
+                model_species = sp_index[(kb_species.species_type.id, kb_species.compartment.id)]
                 all_species[model_species.gen_id()] = model_species
 
             for kb_observable_observable in kb_observable.expression.observables:
@@ -348,10 +425,16 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         kb = self.knowledge_base
         model = self.model
 
-        for kb_rxn in kb.cell.reactions:
-            submodel_id = 'metabolism'
-            submodel = model.submodels.get_or_create(id=submodel_id)
+        if not kb.cell.reactions:
+            return
 
+        cmp_by_id = self._get_compartments_by_id()
+        sp_index = self._get_species_index()
+
+        submodel_id = 'metabolism'
+        submodel = model.submodels.get_or_create(id=submodel_id)
+
+        for kb_rxn in kb.cell.reactions:
             model_rxn = model.reactions.create(
                 submodel=submodel,
                 id=kb_rxn.id + '_kb',
@@ -361,13 +444,13 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
 
             for participant in kb_rxn.participants:
                 kb_species = participant.species
-                model_species_type = model.species_types.get_one(id=kb_species.species_type.id)
-                model_compartment = model.compartments.get_one(id=kb_species.compartment.id)
-                model_species = model_species_type.species.get_one(compartment=model_compartment)
+                model_compartment = cmp_by_id[kb_species.compartment.id]
+                model_species = sp_index.get((kb_species.species_type.id, model_compartment.id))
 
                 # ensure that species are present in extracellular space
                 if model_species is None:
-                    model_species = self.gen_species_type(kb_species.species_type, model_compartment)
+                    model_species_type = self.gen_species_type(kb_species.species_type, [model_compartment.id])
+                    model_species = sp_index[(model_species_type.id, model_compartment.id)]
                 model_rxn.participants.add(
                     model_species.species_coefficients.get_or_create(coefficient=participant.coefficient))
 
@@ -376,53 +459,87 @@ class InitalizeModel(wc_model_gen.ModelComponentGenerator):
         kb = self.knowledge_base
         model = self.model
 
-        avogadro = model.parameters.get_or_create(id='Avogadro')
+        model.parameters.get_or_create(id='Avogadro')
+
+        submodel_id = 'metabolism' # same todo as for reactions
+        submodel = model.submodels.get_one(id=submodel_id)
+        if submodel is None:
+            return
+
+        # model objects that the KB rate laws refer to, keyed by their ids; the volumes are
+        # keyed by the ids of their compartments
+        lookups = {
+            wc_lang.Parameter: {p.id: p for p in model.parameters},
+            wc_lang.Observable: {o.id: o for o in model.observables},
+            wc_lang.Compartment: {c.id: c.init_density.function_expressions[0].function for c in model.compartments
+                                  if c.init_density and c.init_density.function_expressions},
+        }
+
+        rxn_by_id = {rxn.id: rxn for rxn in submodel.reactions}
 
         for kb_rxn in kb.cell.reactions:
-            submodel_id = 'metabolism' # same todo as for reactions
-            submodel = model.submodels.get_or_create(id=submodel_id)
-            model_rxn = submodel.reactions.get_one(id=kb_rxn.id + '_kb')
+            model_rxn = rxn_by_id.get(kb_rxn.id + '_kb')
 
             for kb_rate_law in kb_rxn.rate_laws:
-                all_parameters = {}
-                all_parameters[avogadro.id] = avogadro
-                all_species = {}
-                all_observables = {}
-                all_volumes = {}
-
-                kb_expression = kb_rate_law.expression.expression
-
-                for observable in kb_rate_law.expression.observables:
-                    all_observables[observable.id] = model.observables.get_one(id=observable.id)
-
-                for species in kb_rate_law.expression.species:
-                    model_species_type = model.species_types.get_one(id=species.species_type.id)
-                    model_compartment = model.compartments.get_one(id=species.compartment.id)
-                    volume = model_compartment.init_density.function_expressions[0].function
-                    model_species = model_species_type.species.get_one(compartment=model_compartment)
-                    all_species[model_species.gen_id()] = model_species
-                    all_volumes[volume.id] = volume
-
-                for param in kb_rate_law.expression.parameters:
-                    all_parameters[param.id] = model.parameters.get_one(id=param.id)
-                    if 'K_m' in param.id:
-                        volume = model.compartments.get_one(id=param.id[param.id.rfind(
-                            '_')+1:]).init_density.function_expressions[0].function
-                        unit_adjusted_term = '{} * {} * {}'.format(param.id, avogadro.id, volume.id)
-                        kb_expression = kb_expression.replace(param.id, unit_adjusted_term)
-
-                rate_law_expression, error = wc_lang.RateLawExpression.deserialize(
-                    kb_expression, {
-                        wc_lang.Parameter: all_parameters,
-                        wc_lang.Species: all_species,
-                        wc_lang.Observable: all_observables,
-                        wc_lang.Function: all_volumes,
-                    })
-                assert error is None, str(error)
-
-                model_rate_law = model.rate_laws.create(
-                    expression=rate_law_expression,
-                    reaction=model_rxn,
-                    direction=wc_lang.RateLawDirection[kb_rate_law.direction.name],
-                    comments=kb_rate_law.comments)
-                model_rate_law.id = model_rate_law.gen_id()
+                self._gen_kb_rate_law(model_rxn, kb_rate_law, lookups)
+
+    def _gen_kb_rate_law(self, model_rxn, kb_rate_law, lookups):
+        """ Generate the model rate law of a rate law encoded in KB
+
+        Args:
+            model_rxn (:obj:`wc_lang.Reaction`): model reaction
+            kb_rate_law (:obj:`wc_kb.core.RateLaw`): knowledge base rate law
+            lookups (:obj:`dict`): model parameters and observables keyed by their ids, and
+                volume functions keyed by the ids of their compartments
+
+        Returns:
+            :obj:`wc_lang.RateLaw`: model rate law
+        """
+        model = self.model
+        sp_index = self._get_species_index()
+        param_by_id = lookups[wc_lang.Parameter]
+        obs_by_id = lookups[wc_lang.Observable]
+        volume_by_cmp = lookups[wc_lang.Compartment]
+        avogadro = param_by_id['Avogadro']
+
+        all_parameters = {}
+        all_parameters[avogadro.id] = avogadro
+        all_species = {}
+        all_observables = {}
+        all_volumes = {}
+
+        kb_expression = kb_rate_law.expression.expression
+
+        for observable in kb_rate_law.expression.observables:
+            all_observables[observable.id] = obs_by_id.get(observable.id)
+
+        for species in kb_rate_law.expression.species:
+            volume = volume_by_cmp[species.compartment.id]
+            model_species = sp_index[(species.species_type.id, species.compartment.id)]
+            all_species[model_species.gen_id()] = model_species
+            all_volumes[volume.id] = volume
+
+        for param in kb_rate_law.expression.parameters:
+            all_parameters[param.id] = param_by_id.get(param.id)
+            if 'K_m' in param.id:
+                volume = volume_by_cmp[param.id[param.id.rfind('_')+1:]]
+                unit_adjusted_term = f'{param.id} * {avogadro.id} * {volume.id}'
+                kb_expression = kb_expression.replace(param.id, unit_adjusted_term)
+
+        rate_law_expression, error = wc_lang.RateLawExpression.deserialize(
+            kb_expression, {
+                wc_lang.Parameter: all_parameters,
+                wc_lang.Species: all_species,
+                wc_lang.Observable: all_observables,
+                wc_lang.Function: all_volumes,
+            })
+        assert error is None, str(error)
+
+        model_rate_law = model.rate_laws.create(
+            expression=rate_law_expression,
+            reaction=model_rxn,
+            direction=wc_lang.RateLawDirection[kb_rate_law.direction.name],
+            comments=kb_rate_law.comments)
+        model_rate_law.id = model_rate_law.gen_id()
+
+        return model_rate_law
@@ -8,15 +8,12 @@
 :License: MIT
 """
 
-from wc_onto import onto as wc_ontology
 from wc_utils.util.units import unit_registry
 import wc_model_gen.utils as utils
 import scipy.constants
 import wc_model_gen
 import wc_lang
 import wc_kb
-import numpy
-import math
 
 
 class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
@@ -49,36 +46,38 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         h2o = model.species_types.get_one(id='h2o').species.get_one(compartment=cytosol)
         h = model.species_types.get_one(id='h').species.get_one(compartment=cytosol)
 
+        sc_cache = {}
+
+        species_by_st_id = {sp.species_type.id: sp for sp in model.species if sp.compartment == cytosol}
+
+        # Counterintuitively .specie is a KB species_coefficient object
+        degradosome_species_models = [species_by_st_id[degradosome_kb.species_type.id]
+            for degradosome_kb in cell.observables.get_one(id='degrade_rnase_obs').expression.species]
+
         rna_kbs = cell.species_types.get(__type=wc_kb.prokaryote.RnaSpeciesType)
         for rna_kb in rna_kbs:
 
-            rna_model = model.species_types.get_one(id=rna_kb.id).species.get_one(compartment=cytosol)
-            seq = rna_kb.get_seq()
+            rna_model = species_by_st_id[rna_kb.id]
+            ntp_count = utils.calc_ntp_count(rna_kb.get_seq())
             reaction = model.reactions.get_or_create(submodel=submodel, id='degradation_' + rna_kb.id)
             reaction.name = 'degradation ' + rna_kb.name
             reaction.participants = []
 
             # Adding participants to LHS
-            reaction.participants.add(rna_model.species_coefficients.get_or_create(coefficient=-1))
-            reaction.participants.add(h2o.species_coefficients.get_or_create(coefficient=-(rna_kb.get_len() - 1)))
+            reaction.participants.add(utils.get_species_coefficient(rna_model, -1, sc_cache))
+            reaction.participants.add(utils.get_species_coefficient(h2o, -(ntp_count['len'] - 1), sc_cache))
 
             # Adding participants to RHS
-            reaction.participants.add(amp.species_coefficients.get_or_create(coefficient=seq.count('A')))
-            reaction.participants.add(cmp.species_coefficients.get_or_create(coefficient=seq.count('C')))
-            reaction.participants.add(gmp.species_coefficients.get_or_create(coefficient=seq.count('G')))
-            reaction.participants.add(ump.species_coefficients.get_or_create(coefficient=seq.count('U')))
-            reaction.participants.add(h.species_coefficients.get_or_create(coefficient=rna_kb.get_len() - 1))
+            reaction.participants.add(utils.get_species_coefficient(amp, ntp_count['A'], sc_cache))
+            reaction.participants.add(utils.get_species_coefficient(cmp, ntp_count['C'], sc_cache))
+            reaction.participants.add(utils.get_species_coefficient(gmp, ntp_count['G'], sc_cache))
+            reaction.participants.add(utils.get_species_coefficient(ump, ntp_count['U'], sc_cache))
+            reaction.participants.add(utils.get_species_coefficient(h, ntp_count['len'] - 1, sc_cache))
 
             # Add members of the degradosome
-            # Counterintuitively .specie is a KB species_coefficient object
-            for degradosome_kb in cell.observables.get_one(id='degrade_rnase_obs').expression.species:
-                degradosome_species_type_model = model.species_types.get_one(id=degradosome_kb.species_type.id)
-                degradosome_species_model = degradosome_species_type_model.species.get_one(compartment=cytosol)
-
-                reaction.participants.add(degradosome_species_model.species_coefficients.get_or_create(
-                    coefficient=-1))
-                reaction.participants.add(degradosome_species_model.species_coefficients.get_or_create(
-                    coefficient=1))
+            for degradosome_species_model in degradosome_species_models:
+                reaction.participants.add(utils.get_species_coefficient(degradosome_species_model, -1, sc_cache))
+                reaction.participants.add(utils.get_species_coefficient(degradosome_species_model, 1, sc_cache))
 
     def gen_rate_laws(self):
         """ Generate rate laws for the reactions in the submodel """
@@ -113,15 +112,23 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
         cytosol = model.compartments.get_one(id='c')
 
         init_species_counts = {}
+        compartment_volumes = {cytosol.id: cytosol.init_volume.mean * cytosol.init_density.value}
 
         modifier = model.observables.get_one(id='degrade_rnase_obs')
         for species in modifier.expression.species:
             init_species_counts[species.gen_id()] = species.distribution_init_concentration.mean
 
+        species_by_st_id = {sp.species_type.id: sp for sp in model.species if sp.compartment == cytosol}
+
+        rxn_by_id = {rxn.id: rxn for rxn in self.submodel.reactions}
+        param_by_id = {param.id: param for param in model.parameters}
+
         rnas_kb = self.knowledge_base.cell.species_types.get(__type=wc_kb.prokaryote.RnaSpeciesType)
-        for rna_kb, reaction in zip(rnas_kb, self.submodel.reactions):
+        for rna_kb in rnas_kb:
+
+            reaction = rxn_by_id['degradation_' + rna_kb.id]
 
-            rna_reactant = model.species_types.get_one(id=rna_kb.id).species.get_one(compartment=cytosol)
+            rna_reactant = species_by_st_id[rna_kb.id]
             half_life = rna_kb.properties.get_one(property='half_life').get_value()
             mean_concentration = rna_reactant.distribution_init_concentration.mean
 
@@ -131,15 +138,14 @@ class RnaDegradationSubmodelGenerator(wc_model_gen.SubmodelGenerator):
 
                 init_species_counts[species.gen_id()] = species.distribution_init_concentration.mean
 
-                if model.parameters.get(id='K_m_{}_{}'.format(reaction.id, species.species_type.id)):
-                    model_Km = model.parameters.get_one(
-                        id='K_m_{}_{}'.format(reaction.id, species.species_type.id))
+                model_Km = param_by_id.get('K_m_{}_{}'.format(reaction.id, species.species_type.id))
+                if model_Km:
                     model_Km.value = beta * species.distribution_init_concentration.mean \
                         / Avogadro.value / species.compartment.init_volume.mean
 
-            model_kcat = model.parameters.get_one(id='k_cat_{}'.format(reaction.id))
+            model_kcat = param_by_id.get('k_cat_{}'.format(reaction.id))
             model_kcat.value = 1.
             model_kcat.value = average_rate / reaction.rate_laws[0].expression._parsed_expression.eval({
                 wc_lang.Species: init_species_counts,
-                wc_lang.Compartment: {cytosol.id: cytosol.init_volume.mean * cytosol.init_density.value},
+                wc_lang.Compartment: compartment_volumes,
             })
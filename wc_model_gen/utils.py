@@ -11,6 +11,7 @@ from wc_utils.util.units import unit_registry
 import collections
 import conv_opt
 import math
+import numpy
 import scipy.constants
 import wc_lang
 
@@ -34,18 +35,80 @@ def calc_avg_syn_rate(mean_concentration, half_life, mean_doubling_time):
 def calc_avg_deg_rate(mean_concentration, half_life):
     """ Calculate the average degradation rate of a species over a cell cycle
 
+        The concentrations and half-lives can also be arrays, in which case the rates of
+        all the species are calculated element-wise in one step
+
         Args:
-            mean_concentration (:obj:`float`): species mean concentration
-            half_life (:obj:`float`): species half life
+            mean_concentration (:obj:`float` or :obj:`numpy.ndarray`): species mean concentration
+            half_life (:obj:`float` or :obj:`numpy.ndarray`): species half life
 
         Returns:
-            :obj:`float`: the average degradation rate of the species
+            :obj:`float` or :obj:`numpy.ndarray`: the average degradation rate of the species
+
+        Raises:
+            :obj:`ZeroDivisionError`: if a half-life is zero
     """
+    if numpy.any(numpy.asarray(half_life) == 0):
+        raise ZeroDivisionError('The half-life of a species is zero')
+
     ave_degradation_rate = math.log(2) / half_life * mean_concentration
 
     return ave_degradation_rate
 
 
+def calc_ntp_count(seq, extra_letters=()):
+    """ Count the nucleotides of an RNA sequence
+
+        The sequence is upper-cased and encoded once, and the nucleotides are
+        tallied with :obj:`bytes.count`, which avoids unicode handling
+
+        Args:
+            seq (:obj:`str` or :obj:`Bio.Seq.Seq`): RNA sequence; lowercase letters
+                are counted together with uppercase ones
+            extra_letters (:obj:`list` of :obj:`str`, optional): other uppercase letters,
+                such as 'N', to count in the sequence
+
+        Returns:
+            :obj:`dict`: numbers of 'A', 'C', 'G' and 'U' and of any extra letters
+                in the sequence, and its length ('len')
+    """
+    seq_bytes = str(seq).upper().encode('ascii')
+
+    ntp_count = {
+        'A': seq_bytes.count(b'A'),
+        'C': seq_bytes.count(b'C'),
+        'G': seq_bytes.count(b'G'),
+        'U': seq_bytes.count(b'U'),
+        'len': len(seq_bytes),
+        }
+    for letter in extra_letters:
+        ntp_count[letter] = seq_bytes.count(letter.encode('ascii'))
+
+    return ntp_count
+
+
+def get_species_coefficient(species, coefficient, cache):
+    """ Get or create the coefficient of a species, reusing the coefficients
+        already looked up through a cache so that the coefficients of the species
+        are not scanned again for every reaction
+
+        Args:
+            species (:obj:`wc_lang.Species`): species
+            coefficient (:obj:`float`): coefficient of the species in a reaction
+            cache (:obj:`dict`): species coefficients already looked up, keyed by
+                the species and the coefficient; updated in place
+
+        Returns:
+            :obj:`wc_lang.SpeciesCoefficient`: species coefficient
+    """
+    key = (id(species), coefficient)
+    species_coefficient = cache.get(key)
+    if species_coefficient is None:
+        species_coefficient = cache[key] = species.species_coefficients.get_or_create(
+            coefficient=coefficient)
+    return species_coefficient
+
+
 def test_metabolite_production(submodel, reaction_bounds, pseudo_reactions=None, 
     test_producibles=None, test_recyclables=None):
     """ Test that an FBA metabolism submodel can produce each reactant component (producible) 
@@ -313,7 +376,7 @@ def gen_michaelis_menten_like_rate_law(model, reaction, modifiers=None, modifier
                 :obj:`wc_lang.RateLawExpression`: rate law
                 :obj:`list` of :obj:`wc_lang.Parameter`: list of parameters in the rate law     
     """
-    modifier_species = []
+    modifier_species = set()
     all_species = {}
     all_volumes = {}
     all_observables = {}
@@ -323,22 +386,22 @@ def gen_michaelis_menten_like_rate_law(model, reaction, modifiers=None, modifier
             if type(modifier) == wc_lang.Observable:
                 all_observables[modifier.id] = modifier
                 for species in modifier.expression.species:
-                    modifier_species.append(species)                    
+                    modifier_species.add(species)                    
             elif type(modifier) == wc_lang.Species:
-                modifier_species.append(modifier)
+                modifier_species.add(modifier)
                 all_species[modifier.gen_id()] = modifier
             else:
                 raise TypeError('The modifiers contain element(s) that is not an observable or a species')          
 
     if modifier_reactants is None:
-        additional_reactants = []
+        additional_reactants = set()
     else:
-        additional_reactants = modifier_reactants
+        additional_reactants = set(modifier_reactants)
 
     if exclude_substrates:
-        excluded_reactants = exclude_substrates
+        excluded_reactants = set(exclude_substrates)
     else:
-        excluded_reactants = []    
+        excluded_reactants = set()    
 
     avogadro = model.parameters.get_or_create(
         id='Avogadro',
@@ -353,23 +416,29 @@ def gen_michaelis_menten_like_rate_law(model, reaction, modifiers=None, modifier
                                                 (' * molecule^{{-{}}}'.format(len(modifiers))) if modifiers else '')))
     all_parameters[model_k_cat.id] = model_k_cat
 
+    molar_units = unit_registry.parse_units('M')
+    volume_by_cmp = {}
     expression_terms = []    
     for species in reaction.get_reactants():
 
         if (species not in modifier_species or species in additional_reactants) and species not in excluded_reactants:
 
-            all_species[species.gen_id()] = species
+            species_id = species.gen_id()
+            all_species[species_id] = species
 
             model_k_m = model.parameters.get_or_create(id='K_m_{}_{}'.format(reaction.id, species.species_type.id),
                                                 type=wc_ontology['WC:K_m'],
-                                                units=unit_registry.parse_units('M'))
+                                                units=molar_units)
             all_parameters[model_k_m.id] = model_k_m
 
-            volume = species.compartment.init_density.function_expressions[0].function
-            all_volumes[volume.id] = volume
+            compartment = species.compartment
+            volume = volume_by_cmp.get(compartment.id)
+            if volume is None:
+                volume = volume_by_cmp[compartment.id] = compartment.init_density.function_expressions[0].function
+                all_volumes[volume.id] = volume
 
-            expression_terms.append('({} / ({} + {} * {} * {}))'.format(species.gen_id(),
-                                                                        species.gen_id(),
+            expression_terms.append('({} / ({} + {} * {} * {}))'.format(species_id,
+                                                                        species_id,
                                                                         model_k_m.id, avogadro.id,
                                                                         volume.id))
 
@@ -443,25 +512,31 @@ def gen_michaelis_menten_like_propensity_function(model, reaction, substrates_as
                                                     len(substrates_as_modifiers))))))
     parameters[model_k_cat.id] = model_k_cat
 
+    molar_units = unit_registry.parse_units('M')
+    volume_by_cmp = {}
     expression_terms = []
     all_species = {}
     all_volumes = {}
     for species in reaction.get_reactants():
 
-        all_species[species.gen_id()] = species
+        species_id = species.gen_id()
+        all_species[species_id] = species
 
         if species not in substrates_as_modifiers and species not in excluded_reactants:            
 
             model_k_m = model.parameters.get_or_create(id='K_m_{}_{}'.format(reaction.id, species.species_type.id),
                                                 type=wc_ontology['WC:K_m'],
-                                                units=unit_registry.parse_units('M'))
+                                                units=molar_units)
             parameters[model_k_m.id] = model_k_m
 
-            volume = species.compartment.init_density.function_expressions[0].function
-            all_volumes[volume.id] = volume
+            compartment = species.compartment
+            volume = volume_by_cmp.get(compartment.id)
+            if volume is None:
+                volume = volume_by_cmp[compartment.id] = compartment.init_density.function_expressions[0].function
+                all_volumes[volume.id] = volume
 
-            expression_terms.append('({} / ({} + {} * {} * {}))'.format(species.gen_id(),
-                                                                        species.gen_id(),
+            expression_terms.append('({} / ({} + {} * {} * {}))'.format(species_id,
+                                                                        species_id,
                                                                         model_k_m.id, avogadro.id,
                                                                         volume.id))
 
@@ -521,6 +596,8 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
         volume = compartment.init_density.function_expressions[0].function
         all_volumes[volume.id] = volume
 
+        molar_units = unit_registry.parse_units('M')
+        molecule_units = unit_registry.parse_units('molecule')
         factor_exp = []
         for factors in reaction_factors:
             
@@ -530,14 +607,15 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
                 if not factor_species_type:
                     factor_species_type = model.species_types.get_one(id=factors[0])
                 factor_species = factor_species_type.species.get_one(compartment=compartment)                
-                all_species[factor_species.gen_id()] = factor_species
+                factor_species_id = factor_species.gen_id()
+                all_species[factor_species_id] = factor_species
 
                 model_k_m = model.parameters.get_or_create(
                     id='K_m_{}_{}'.format(reaction_id, factor_species.species_type.id),
                     value = beta * factor_species.distribution_init_concentration.mean \
                         / Avogadro.value / compartment.init_volume.mean,
                     type=wc_ontology['WC:K_m'],
-                    units=unit_registry.parse_units('M'),
+                    units=molar_units,
                     comments = 'The value was assumed to be {} times the concentration of {} in {}'.format(
                         beta, factor_species_type.id, compartment.name)
                     )
@@ -548,8 +626,8 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
                 all_parameters[model_k_m.id] = model_k_m                    
 
                 factor_exp.append('({} / ({} + {} * {} * {}))'.format(
-                    factor_species.gen_id(),
-                    factor_species.gen_id(),
+                    factor_species_id,
+                    factor_species_id,
                     model_k_m.id, 
                     Avogadro.id,
                     volume.id))
@@ -563,8 +641,9 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
                     if not factor_species_type:
                         factor_species_type = model.species_types.get_one(id=factor)
                     factor_species = factor_species_type.species.get_one(compartment=compartment)
-                    all_species[factor_species.gen_id()] = factor_species
-                    obs_exp.append(factor_species.gen_id())
+                    factor_species_id = factor_species.gen_id()
+                    all_species[factor_species_id] = factor_species
+                    obs_exp.append(factor_species_id)
                     obs_total += factor_species.distribution_init_concentration.mean
                     obs_exp_string = ' + '.join(sorted(obs_exp))
                 
@@ -580,7 +659,7 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
                     factor_observable = model.observables.get_or_create(
                         id='{}_factors_{}_{}'.format(reaction_class, compartment.id, n+1), 
                         name='factor for {} in {}'.format(reaction_class, compartment.name), 
-                        units=unit_registry.parse_units('molecule'), 
+                        units=molecule_units, 
                         expression=observable_exp)
                     all_observables[factor_observable.id] = factor_observable
                 else:
@@ -591,7 +670,7 @@ def gen_response_functions(model, beta, reaction_id, reaction_class, compartment
                     id='K_m_{}_{}'.format(reaction_class, factor_observable.id),
                     value = beta * obs_total / Avogadro.value / compartment.init_volume.mean,
                     type=wc_ontology['WC:K_m'],
-                    units=unit_registry.parse_units('M'),
+                    units=molar_units,
                     comments = 'The value was assumed to be {} times the value of {}'.format(
                         beta, factor_observable.id)  
                     )